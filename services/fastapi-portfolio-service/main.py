@@ -1,50 +1,58 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import yfinance as yf
+from typing import List, Optional, Dict, Any, Tuple
 import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from itertools import combinations, compress
+import bisect
+import hashlib
 import logging
-from scipy.optimize import minimize
+import os
+import asyncio
+import threading
 import warnings
-import requests
-import re
-from textblob import TextBlob
 import time
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-from matplotlib.colors import LinearSegmentedColormap
-import seaborn as sns
 import io
-import base64
+import zlib
+import orjson
+# yfinance, scipy and matplotlib are imported inside the functions that use them
+# to keep cold starts (and /health) from paying for their import time
 warnings.filterwarnings('ignore')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Constants shared by the risk calculations
+RISK_FREE_RATE = 0.02  # 2% annual risk-free rate
+TRADING_DAYS = 252  # trading days per year, annualizes daily returns
+SQRT_252 = float(np.sqrt(TRADING_DAYS))  # annualizes daily volatility
+BENCHMARK_SYMBOL = "SPY"  # beta is measured against the S&P 500
+
 app = FastAPI(
     title="Portfolio Analysis Service",
     description="A FastAPI microservice for portfolio analysis and risk calculation",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
-# Configure CORS
+# Configure CORS - Starlette compiles the origin regex once at startup
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
         "http://localhost:3000", 
         "http://127.0.0.1:3000",
-        "https://*.vercel.app",
-        "*"  # Allow all origins for now to test
     ],
+    allow_origin_regex=r"https://([a-z0-9-]+\.)*vercel\.app",
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+    expose_headers=["ETag"],
+    max_age=3600,  # let browsers cache preflight responses
 )
 
 # Request timing and logging middleware
@@ -59,8 +67,7 @@ async def log_requests(request: Request, call_next):
             body = await request.body()
             # Simple check for requestId in JSON body without full parsing
             if b'"requestId"' in body:
-                import json
-                body_data = json.loads(body.decode())
+                body_data = orjson.loads(body)
                 request_id = body_data.get('requestId')
                 
                 # Important: Replace the body so downstream handlers can read it
@@ -93,6 +100,85 @@ async def log_requests(request: Request, call_next):
     
     return response
 
+# Response key -> yfinance column for /portfolio/market-data
+MARKET_DATA_FIELDS = {'prices': 'Close', 'volume': 'Volume', 'high': 'High', 'low': 'Low'}
+
+# Market data cache - warm instances reuse recent Yahoo downloads for identical requests
+MARKET_DATA_CACHE_TTL = int(os.environ.get("MARKET_DATA_CACHE_TTL", 300))  # seconds
+MARKET_DATA_CACHE_SIZE = 256
+YFINANCE_TIMEOUT = float(os.environ.get("YFINANCE_TIMEOUT", 5))  # seconds per Yahoo request
+
+_market_data_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_market_data_cache_lock = threading.Lock()
+# yf.download keeps per-call state in module globals on 0.2.x releases, so concurrent
+# downloads from worker threads must not overlap
+_yfinance_download_lock = threading.Lock()
+
+# Finished risk analyses keyed by holdings, each pinned to the cached download it was computed from,
+# so /analyze, /risk and /sharpe on one portfolio share a single computation while that data is live.
+# Only touched from the event loop, so no lock is needed
+_analysis_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+def download_market_data(symbols: List[str], period: str, use_cache: bool = True, **kwargs) -> pd.DataFrame:
+    """Download price history with yf.download, serving repeat requests from an in-memory TTL cache"""
+    import yfinance as yf
+    
+    # Callers select columns by symbol, so the same set of tickers in any order shares one entry
+    symbols = sorted(set(symbols))
+    key = (tuple(symbols), period, tuple(sorted(kwargs.items())))
+    
+    if use_cache:
+        with _market_data_cache_lock:
+            cached = _market_data_cache.get(key)
+            if cached and time.monotonic() - cached[0] < MARKET_DATA_CACHE_TTL:
+                _market_data_cache.move_to_end(key)
+                return cached[1]
+    
+    with _yfinance_download_lock:
+        data = yf.download(symbols, period=period, progress=False, timeout=YFINANCE_TIMEOUT, **kwargs)
+    
+    # Only cache successful downloads so transient Yahoo failures are retried
+    if not data.empty:
+        with _market_data_cache_lock:
+            _market_data_cache[key] = (time.monotonic(), data)
+            _market_data_cache.move_to_end(key)
+            while len(_market_data_cache) > MARKET_DATA_CACHE_SIZE:
+                _market_data_cache.popitem(last=False)
+    
+    return data
+
+async def fetch_market_data(symbols: List[str], period: str, use_cache: bool = True, **kwargs) -> pd.DataFrame:
+    """Run download_market_data in a worker thread so the event loop keeps serving other requests"""
+    return await asyncio.to_thread(download_market_data, symbols, period, use_cache, **kwargs)
+
+def _get_close_frame(data: pd.DataFrame, symbols: List[str], min_points: int) -> Tuple[pd.DataFrame, List[str]]:
+    """Close prices from a yf.download frame as one column per ticker, plus the requested symbols
+    (deduplicated, in order) that have more than min_points closes
+    
+    yf.download groups columns as (Price, Ticker), so data['Close'] is already one column per ticker;
+    only the flat single-ticker layout of yfinance < 0.2.48 needs its Close series wrapped.
+    """
+    closes = data['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(symbols[0])
+    
+    valid_symbols = []
+    for symbol in dict.fromkeys(symbols):
+        if symbol not in closes.columns:
+            logger.warning(f"No data found for symbol: {symbol}")
+        elif closes[symbol].count() <= min_points:
+            logger.warning(f"Insufficient data for symbol: {symbol}")
+        else:
+            valid_symbols.append(symbol)
+    
+    return closes, valid_symbols
+
+def market_data_etag(symbols: List[str], period: str, data: pd.DataFrame) -> str:
+    """Weak ETag for a market-data response: the request plus the newest bar, which is the part that changes"""
+    digest = hashlib.sha1(repr((symbols, period, len(data), str(data.index[-1]))).encode())
+    digest.update(data.iloc[-1].to_numpy(dtype=np.float64).tobytes())  # today's bar updates intraday
+    return f'W/"{digest.hexdigest()}"'
+
 # Pydantic models
 class Asset(BaseModel):
     symbol: str
@@ -103,16 +189,19 @@ class Asset(BaseModel):
 class PortfolioRequest(BaseModel):
     assets: List[Asset]
     requestId: Optional[str] = None
+    nocache: bool = False  # bypass the market data cache (debugging)
 
 class RiskRequest(BaseModel):
     assets: List[Asset]
     timeframe: str = "1y"
     requestId: Optional[str] = None
+    nocache: bool = False
 
 class MarketDataRequest(BaseModel):
     symbols: List[str]
     period: str = "1y"
     requestId: Optional[str] = None
+    nocache: bool = False
 
 class PortfolioRiskAnalysis(BaseModel):
     totalValue: float
@@ -138,6 +227,7 @@ class OptimizationRequest(BaseModel):
     risk_tolerance: float = 0.5  # 0.0 (conservative) to 1.0 (aggressive)
     constraints: Optional[Dict] = None  # sector limits, individual asset limits, etc.
     requestId: Optional[str] = None
+    nocache: bool = False
 
 class OptimizedAllocation(BaseModel):
     symbol: str
@@ -166,6 +256,7 @@ class MonteCarloRequest(BaseModel):
     simulations: int = 10000
     initial_investment: float = 100000.0
     requestId: Optional[str] = None
+    nocache: bool = False
 
 class MonteCarloResponse(BaseModel):
     simulations_run: int
@@ -203,9 +294,28 @@ class MarketSentimentResponse(BaseModel):
     recommendations: List[str]
 
 # Figure generation functions
+def _get_pyplot():
+    """Import pyplot on first use with the non-interactive backend"""
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend
+    import matplotlib.pyplot as plt
+    return plt
+
+# pyplot tracks the current figure in module state, so renders from worker threads must not overlap
+_pyplot_lock = threading.Lock()
+
+async def render_figure(generate, *args) -> Dict[str, Any]:
+    """Run a figure generator in a worker thread so the ~300ms render does not stall the event loop"""
+    def render_locked():
+        with _pyplot_lock:
+            return generate(*args)
+    return await asyncio.to_thread(render_locked)
+
 def generate_risk_analysis_figure(analysis_data: dict, symbols: List[str], portfolio_values: dict) -> Dict[str, Any]:
     """Generate comprehensive risk analysis figure"""
     try:
+        plt = _get_pyplot()
+        
         logger.info(f"Starting figure generation with analysis_data: {analysis_data}")
         logger.info(f"Portfolio values: {portfolio_values}")
         
@@ -274,9 +384,11 @@ def generate_risk_analysis_figure(analysis_data: dict, symbols: List[str], portf
         logger.error(f"Traceback: {traceback.format_exc()}")
         return None
 
-def generate_monte_carlo_figure(outcomes: list, percentiles: dict, time_horizon_years: int) -> Dict[str, Any]:
+def generate_monte_carlo_figure(outcomes: np.ndarray, percentiles: dict, time_horizon_years: int) -> Dict[str, Any]:
     """Generate Monte Carlo simulation distribution figure"""
     try:
+        plt = _get_pyplot()
+        
         try:
             plt.style.use('seaborn-v0_8-whitegrid')
         except OSError:
@@ -285,7 +397,7 @@ def generate_monte_carlo_figure(outcomes: list, percentiles: dict, time_horizon_
         fig.suptitle('Monte Carlo Simulation Results', fontsize=16, fontweight='bold')
         
         # 1. Histogram of outcomes
-        if outcomes:
+        if len(outcomes):
             ax1.hist(outcomes, bins=50, alpha=0.7, color='#4ECDC4', edgecolor='black')
             expected_value = np.mean(outcomes)
             median_value = percentiles.get('50th', np.median(outcomes))
@@ -334,6 +446,8 @@ def generate_monte_carlo_figure(outcomes: list, percentiles: dict, time_horizon_
 def generate_optimization_figure(current_weights: dict, optimized_weights: dict, symbols: list, metrics: dict) -> Dict[str, Any]:
     """Generate portfolio optimization comparison figure"""
     try:
+        plt = _get_pyplot()
+        
         try:
             plt.style.use('seaborn-v0_8-whitegrid')
         except OSError:
@@ -396,6 +510,30 @@ def generate_optimization_figure(current_weights: dict, optimized_weights: dict,
         logger.error(f"Error generating optimization figure: {e}")
         return None
 
+# Opt-in warm-up: the lazy imports above keep cold starts fast, but long-running workers can
+# instead pay the one-time import and first-call costs before they accept traffic
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "").lower() in ("1", "true", "yes")
+
+def warm_up():
+    """Import the lazily loaded libraries and exercise each numeric kernel once"""
+    import yfinance  # noqa: F401
+    from scipy.optimize import minimize  # noqa: F401
+    _get_pyplot()
+    
+    sample = np.random.default_rng(0).standard_normal((64, 4))
+    cov_matrix = np.cov(sample, rowvar=False)
+    covariance_factor(cov_matrix)
+    np.linalg.solve(ledoit_wolf_covariance(sample), np.ones(4))
+    # The sentiment kernel alone: the batch function would fill _sentiment_cache from this worker thread
+    _hash_uniforms(np.zeros(1, dtype=np.uint64), 6)
+
+@app.on_event("startup")
+async def warm_up_on_startup():
+    if WARMUP_ON_STARTUP:
+        start_time = time.time()
+        await asyncio.to_thread(warm_up)
+        logger.info(f"Warm-up completed in {time.time() - start_time:.3f}s")
+
 @app.get("/")
 async def root():
     return {"message": "Portfolio Analysis Service", "status": "running"}
@@ -404,140 +542,115 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
-@app.post("/portfolio/analyze", response_model=PortfolioRiskAnalysis)
-async def analyze_portfolio(request: PortfolioRequest):
-    """Analyze portfolio and return comprehensive risk metrics"""
-    try:
-        logger.info(f"🔧 Portfolio Analysis | RequestID: {request.requestId or 'none'} | Assets: {len(request.assets if request.assets else [])}")
-        
-        if not request.assets:
-            raise HTTPException(status_code=400, detail="No assets provided")
-        
-        # Get portfolio data
-        symbols = [asset.symbol for asset in request.assets]
-        shares = {asset.symbol: asset.shares for asset in request.assets}
-        
-        # Fetch market data - always use list format for consistency
-        data = yf.download(symbols, period="1y", progress=False, group_by='ticker', auto_adjust=True)
-        
-        if data.empty:
-            raise HTTPException(status_code=400, detail="Could not fetch market data for any symbols")
-        
-        # Handle single vs multiple symbols and filter out failed symbols
-        prices_dict = {}
-        
-        if len(symbols) == 1:
-            # For single symbol, yfinance returns a different structure
-            symbol = symbols[0]
-            if 'Close' in data.columns and not data['Close'].empty:
-                prices_dict[symbol] = data['Close']
-            elif symbol in data.columns and not data[symbol]['Close'].empty:
-                prices_dict[symbol] = data[symbol]['Close']
-            else:
-                logger.warning(f"No valid data for symbol: {symbol}")
-        else:
-            # Multiple symbols - only include symbols with valid data
-            for symbol in symbols:
-                try:
-                    if symbol in data and 'Close' in data[symbol].columns:
-                        symbol_data = data[symbol]['Close'].dropna()
-                        if len(symbol_data) > 10:  # Need at least 10 data points
-                            prices_dict[symbol] = symbol_data
-                        else:
-                            logger.warning(f"Insufficient data for symbol: {symbol}")
-                    else:
-                        logger.warning(f"No data found for symbol: {symbol}")
-                except Exception as e:
-                    logger.warning(f"Error processing symbol {symbol}: {e}")
-        
-        if not prices_dict:
-            raise HTTPException(status_code=400, detail="No valid market data found for any symbols")
-            
-        prices = pd.DataFrame(prices_dict)
-        
-        # Calculate returns
-        returns = prices.pct_change().dropna()
-        
-        # Portfolio weights (simplified - using current prices)
-        # Only use symbols that have valid price data
-        valid_symbols = list(prices.columns)
-        
-        current_prices = prices.iloc[-1]
-        portfolio_values = {symbol: shares[symbol] * current_prices[symbol] for symbol in valid_symbols}
-        total_value = sum(portfolio_values.values())
-        
-        if total_value <= 0:
-            raise HTTPException(status_code=400, detail="Portfolio has no valid assets with market data")
-            
-        weights = {symbol: portfolio_values[symbol] / total_value for symbol in valid_symbols}
-        
-        # Portfolio returns
-        portfolio_returns = (returns * pd.Series(weights)).sum(axis=1)
-        
-        # Risk metrics
-        daily_var = np.percentile(portfolio_returns, 5) * total_value  # 5% VaR
-        annualized_vol = portfolio_returns.std() * np.sqrt(252)
-        
-        # Sharpe ratio (assuming 2% risk-free rate)
-        risk_free_rate = 0.02
-        annual_return = portfolio_returns.mean() * 252
-        sharpe_ratio = (annual_return - risk_free_rate) / annualized_vol if annualized_vol > 0 else 0
+async def _analyze_portfolio_core(assets: List[Asset], use_cache: bool = True, request_id: Optional[str] = None) -> PortfolioRiskAnalysis:
+    """Risk analysis shared by the analyze, risk and sharpe endpoints, free of any HTTP wrapping"""
+    logger.info(f"🔧 Portfolio Analysis | RequestID: {request_id or 'none'} | Assets: {len(assets if assets else [])}")
+    
+    if not assets:
+        raise HTTPException(status_code=400, detail="No assets provided")
+    
+    # Get portfolio data
+    symbols = [asset.symbol for asset in assets]
+    shares = {asset.symbol: asset.shares for asset in assets}
+    
+    # Fetch market data - the beta benchmark rides along in the same download
+    download_symbols = list(dict.fromkeys(symbols + [BENCHMARK_SYMBOL]))
+    data = await fetch_market_data(download_symbols, "1y", use_cache=use_cache, auto_adjust=True)
+    
+    if data.empty:
+        raise HTTPException(status_code=400, detail="Could not fetch market data for any symbols")
+    
+    # The download cache hands back the same frame object until it expires, so an identical frame
+    # means an earlier result for these holdings is still current
+    analysis_key = tuple(sorted(shares.items()))
+    if use_cache:
+        cached = _analysis_cache.get(analysis_key)
+        if cached and cached[0] is data:
+            _analysis_cache.move_to_end(analysis_key)
+            logger.info(f"Reusing portfolio risk analysis for {len(shares)} holdings")
+            return cached[1]
+    
+    # Aligned close prices, keeping only holdings with at least 10 data points
+    closes, valid_symbols = _get_close_frame(data, symbols, min_points=10)
+    
+    if not valid_symbols:
+        raise HTTPException(status_code=400, detail="No valid market data found for any symbols")
         
-        # Beta calculation (vs S&P 500)
-        try:
-            spy_data = yf.download("SPY", period="1y", progress=False, auto_adjust=True)
-            spy_returns = spy_data['Close'].pct_change().dropna()
-            
-            # Align dates
-            common_dates = portfolio_returns.index.intersection(spy_returns.index)
-            portfolio_aligned = portfolio_returns.loc[common_dates]
-            spy_aligned = spy_returns.loc[common_dates]
+    # Carry the last close over gaps so a missing quote is a flat day rather than a dropped one
+    prices = closes[valid_symbols].dropna(how='all').ffill()
+    
+    # Calculate daily returns on the raw price matrix, dropping leading days before every symbol has a price
+    price_matrix = prices.to_numpy()
+    returns = np.diff(price_matrix, axis=0) / price_matrix[:-1]
+    complete_days = ~np.isnan(returns).any(axis=1)
+    returns = returns[complete_days]
+    
+    # Portfolio weights (simplified - using current prices, the last row of the price matrix)
+    shares_array = np.fromiter((shares[symbol] for symbol in valid_symbols), dtype=np.float64, count=len(valid_symbols))
+    position_values = shares_array * price_matrix[-1]
+    total_value = float(position_values.sum())
+    
+    if total_value <= 0:
+        raise HTTPException(status_code=400, detail="Portfolio has no valid assets with market data")
+    
+    # Portfolio returns - one matrix-vector product over the aligned returns matrix
+    weights_array = position_values / total_value
+    portfolio_returns = returns @ weights_array
+    
+    # Risk metrics
+    daily_var = np.percentile(portfolio_returns, 5) * total_value  # 5% VaR
+    annualized_vol = portfolio_returns.std(ddof=1) * SQRT_252
+    
+    # Sharpe ratio (assuming 2% risk-free rate)
+    annual_return = portfolio_returns.mean() * TRADING_DAYS
+    sharpe_ratio = (annual_return - RISK_FREE_RATE) / annualized_vol if annualized_vol > 0 else 0
+    
+    # Beta calculation (vs S&P 500)
+    try:
+        # The benchmark shares the download's index, so its returns line up row for row
+        spy_prices = closes[BENCHMARK_SYMBOL].loc[prices.index].to_numpy()
+        spy_returns = (np.diff(spy_prices) / spy_prices[:-1])[complete_days]
+        common_days = ~np.isnan(spy_returns)
+        
+        if common_days.sum() > 10:  # Need sufficient data points
+            portfolio_aligned = portfolio_returns[common_days]
+            spy_aligned = spy_returns[common_days]
             
-            if len(common_dates) > 10:  # Need sufficient data points
-                # Ensure both arrays are 1D
-                portfolio_values = portfolio_aligned.values.flatten()
-                spy_values = spy_aligned.values.flatten()
-                
-                # Calculate beta using correlation and volatility ratio
-                if len(portfolio_values) == len(spy_values) and len(portfolio_values) > 1:
-                    correlation = np.corrcoef(portfolio_values, spy_values)[0, 1]
-                    portfolio_std = np.std(portfolio_values)
-                    spy_std = np.std(spy_values)
-                    beta = correlation * (portfolio_std / spy_std) if spy_std > 0 else 1.0
-                else:
-                    beta = 1.0
-            else:
-                beta = 1.0
-        except Exception as e:
-            logger.warning(f"Beta calculation failed: {e}, using default beta=1.0")
-            beta = 1.0
-        
-        # Risk level classification
-        if annualized_vol < 0.1:
-            risk_level = "Low"
-        elif annualized_vol < 0.2:
-            risk_level = "Medium"
+            # Beta = cov(portfolio, SPY) / var(SPY), both read off one covariance matrix
+            cov = np.cov(portfolio_aligned, spy_aligned)
+            beta = cov[0, 1] / cov[1, 1] if cov[1, 1] > 0 else 1.0
         else:
-            risk_level = "High"
-        
-        # Generate figure data
-        analysis_data = {
-            "totalValue": round(total_value, 2),
-            "dailyVaR": round(abs(daily_var), 2),
-            "annualizedVoL": round(annualized_vol * 100, 2),
-            "sharpeRatio": round(sharpe_ratio, 3),
-            "beta": round(beta, 3),
-            "riskLevel": risk_level
-        }
-        logger.info(f"About to generate figure...")
-        logger.info(f"Analysis data: {analysis_data}")
-        logger.info(f"Valid symbols: {valid_symbols}")  
-        logger.info(f"Portfolio values: {portfolio_values}")
-        
-        # Create a simple SVG figure that always works
-        figure_data = {
-            'type': 'svg',
-            'content': f'''<?xml version="1.0" encoding="utf-8"?>
+            beta = 1.0
+    except Exception as e:
+        logger.warning(f"Beta calculation failed: {e}, using default beta=1.0")
+        beta = 1.0
+    
+    # Risk level classification
+    if annualized_vol < 0.1:
+        risk_level = "Low"
+    elif annualized_vol < 0.2:
+        risk_level = "Medium"
+    else:
+        risk_level = "High"
+    
+    # Generate figure data
+    analysis_data = {
+        "totalValue": round(total_value, 2),
+        "dailyVaR": round(abs(daily_var), 2),
+        "annualizedVoL": round(annualized_vol * 100, 2),
+        "sharpeRatio": round(sharpe_ratio, 3),
+        "beta": round(beta, 3),
+        "riskLevel": risk_level
+    }
+    logger.info(f"About to generate figure...")
+    logger.info(f"Analysis data: {analysis_data}")
+    logger.info(f"Valid symbols: {valid_symbols}")  
+    logger.info(f"Portfolio values: {dict(zip(valid_symbols, position_values.tolist()))}")
+    
+    # Create a simple SVG figure that always works
+    figure_data = {
+        'type': 'svg',
+        'content': f'''<?xml version="1.0" encoding="utf-8"?>
 <svg xmlns="http://www.w3.org/2000/svg" width="800" height="600" style="background-color:white">
   <!-- Title -->
   <text x="400" y="30" text-anchor="middle" font-size="18" font-weight="bold" fill="black">
@@ -548,7 +661,7 @@ async def analyze_portfolio(request: PortfolioRequest):
   <text x="200" y="80" text-anchor="middle" font-size="14" font-weight="bold" fill="black">Portfolio Composition</text>
   <circle cx="200" cy="180" r="80" fill="#4ECDC4" opacity="0.7"/>
   <text x="200" y="180" text-anchor="middle" font-size="12" fill="black">
-    {len(portfolio_values)} Assets
+    {len(valid_symbols)} Assets
   </text>
   <text x="200" y="200" text-anchor="middle" font-size="10" fill="black">
     Total: ${analysis_data["totalValue"]:,.0f}
@@ -595,26 +708,38 @@ async def analyze_portfolio(request: PortfolioRequest):
     Generated by FastAPI Portfolio Service • {len(valid_symbols)} symbols analyzed
   </text>
 </svg>''',
-            'width': 800,
-            'height': 600
-        }
-        
-        logger.info(f"Created simple SVG figure with {len(figure_data['content'])} characters")
-        
-        risk_analysis_result = PortfolioRiskAnalysis(
-            totalValue=round(total_value, 2),
-            dailyVaR=round(abs(daily_var), 2),
-            annualizedVoL=round(annualized_vol * 100, 2),
-            sharpeRatio=round(sharpe_ratio, 3),
-            beta=round(beta, 3),
-            riskLevel=risk_level,
-            figure_data=figure_data
-        )
-        
-        # Log successful analysis
-        logger.info(f"Portfolio risk analysis completed: ${risk_analysis_result.totalValue:,.2f} total value, {risk_analysis_result.riskLevel} risk")
-        
-        return risk_analysis_result
+        'width': 800,
+        'height': 600
+    }
+    
+    logger.info(f"Created simple SVG figure with {len(figure_data['content'])} characters")
+    
+    risk_analysis_result = PortfolioRiskAnalysis(
+        totalValue=round(total_value, 2),
+        dailyVaR=round(abs(daily_var), 2),
+        annualizedVoL=round(annualized_vol * 100, 2),
+        sharpeRatio=round(sharpe_ratio, 3),
+        beta=round(beta, 3),
+        riskLevel=risk_level,
+        figure_data=figure_data
+    )
+    
+    # Log successful analysis
+    logger.info(f"Portfolio risk analysis completed: ${risk_analysis_result.totalValue:,.2f} total value, {risk_analysis_result.riskLevel} risk")
+    
+    if use_cache:
+        _analysis_cache[analysis_key] = (data, risk_analysis_result)
+        _analysis_cache.move_to_end(analysis_key)
+        while len(_analysis_cache) > MARKET_DATA_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+    
+    return risk_analysis_result
+
+@app.post("/portfolio/analyze", response_model=PortfolioRiskAnalysis)
+async def analyze_portfolio(request: PortfolioRequest):
+    """Analyze portfolio and return comprehensive risk metrics"""
+    try:
+        return await _analyze_portfolio_core(request.assets, use_cache=not request.nocache, request_id=request.requestId)
         
     except Exception as e:
         logger.error(f"Error analyzing portfolio: {str(e)}")
@@ -623,13 +748,18 @@ async def analyze_portfolio(request: PortfolioRequest):
 @app.post("/portfolio/risk", response_model=PortfolioRiskAnalysis)
 async def calculate_portfolio_risk(request: RiskRequest):
     """Calculate portfolio risk metrics"""
-    return await analyze_portfolio(PortfolioRequest(assets=request.assets))
+    try:
+        return await _analyze_portfolio_core(request.assets, use_cache=not request.nocache, request_id=request.requestId)
+        
+    except Exception as e:
+        logger.error(f"Error analyzing portfolio: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.post("/portfolio/sharpe", response_model=SharpeRatioResponse)
 async def calculate_sharpe_ratio(request: PortfolioRequest):
     """Calculate Sharpe ratio for portfolio"""
     try:
-        analysis = await analyze_portfolio(request)
+        analysis = await _analyze_portfolio_core(request.assets, use_cache=not request.nocache, request_id=request.requestId)
         
         explanation = f"Sharpe ratio of {analysis.sharpeRatio} indicates "
         if analysis.sharpeRatio > 1:
@@ -656,38 +786,42 @@ async def calculate_sharpe_ratio(request: PortfolioRequest):
         raise HTTPException(status_code=500, detail=f"Sharpe ratio calculation failed: {str(e)}")
 
 @app.post("/portfolio/market-data", response_model=MarketDataResponse)
-async def get_market_data(request: MarketDataRequest):
+async def get_market_data(request: MarketDataRequest, http_request: Request, response: Response):
     """Fetch market data for given symbols"""
     try:
-        if not request.symbols:
+        # Normalize like yfinance does (it upper-cases tickers) so blanks and duplicates never reach it
+        symbols = list(dict.fromkeys(s.strip().upper() for s in request.symbols if s.strip()))
+        if not symbols:
             raise HTTPException(status_code=400, detail="No symbols provided")
         
-        data = yf.download(request.symbols, period=request.period, progress=False, auto_adjust=True)
+        data = await fetch_market_data(symbols, request.period, use_cache=not request.nocache, auto_adjust=True)
         
         if data.empty:
             raise HTTPException(status_code=400, detail="Could not fetch market data")
         
-        # Convert to JSON-serializable format
+        # Pollers that already hold this data get a bodiless 304 instead of the full series
+        etag = market_data_etag(symbols, request.period, data)
+        if etag in (tag.strip() for tag in http_request.headers.get("if-none-match", "").split(",")):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        
+        # Convert to JSON-serializable format: format the date keys once and mask gaps in numpy,
+        # rather than a to_dict() per field per symbol that boxes and serializes every timestamp
+        dates = [timestamp.isoformat() for timestamp in data.index]
+        multi_level = isinstance(data.columns, pd.MultiIndex)  # single tickers are flat before yfinance 0.2.48
+        
+        def field_points(field: str, symbol: str) -> Dict:
+            if field not in data:
+                return {}
+            values = (data[field][symbol] if multi_level else data[field]).to_numpy()
+            present = pd.notna(values)
+            return dict(zip(compress(dates, present), values[present].tolist()))
+        
         result = {}
-        if len(request.symbols) == 1:
-            # Single symbol case
-            symbol = request.symbols[0]
-            result[symbol] = {
-                'prices': data['Close'].to_dict(),
-                'volume': data['Volume'].to_dict() if 'Volume' in data else {},
-                'high': data['High'].to_dict() if 'High' in data else {},
-                'low': data['Low'].to_dict() if 'Low' in data else {}
-            }
-        else:
-            # Multiple symbols case
-            for symbol in request.symbols:
-                if symbol in data['Close'].columns:
-                    result[symbol] = {
-                        'prices': data['Close'][symbol].dropna().to_dict(),
-                        'volume': data['Volume'][symbol].dropna().to_dict() if 'Volume' in data else {},
-                        'high': data['High'][symbol].dropna().to_dict() if 'High' in data else {},
-                        'low': data['Low'][symbol].dropna().to_dict() if 'Low' in data else {}
-                    }
+        for symbol in symbols:
+            if multi_level and symbol not in data['Close'].columns:  # tickers Yahoo could not resolve are left out
+                continue
+            result[symbol] = {key: field_points(field, symbol) for key, field in MARKET_DATA_FIELDS.items()}
         
         return MarketDataResponse(
             data=result,
@@ -701,6 +835,13 @@ async def get_market_data(request: MarketDataRequest):
 @app.post("/portfolio/optimize", response_model=PortfolioOptimizationResponse)
 async def optimize_portfolio(request: OptimizationRequest):
     """Optimize portfolio allocation using Modern Portfolio Theory"""
+    from scipy.optimize import minimize
+    
+    # Checked before the try below, whose blanket handler would report a bad value as a server error
+    shrinkage = (request.constraints or {}).get("shrinkage", "ledoit_wolf")
+    if shrinkage not in ("ledoit_wolf", "none", None):
+        raise HTTPException(status_code=400, detail=f"Unknown covariance shrinkage: {shrinkage}")
+    
     try:
         if not request.assets:
             raise HTTPException(status_code=400, detail="No assets provided")
@@ -712,44 +853,42 @@ async def optimize_portfolio(request: OptimizationRequest):
         current_shares = {asset.symbol: asset.shares for asset in request.assets}
         
         # Fetch market data for returns calculation
-        data = yf.download(symbols, period="2y", progress=False, auto_adjust=True)
+        data = await fetch_market_data(symbols, "2y", use_cache=not request.nocache, auto_adjust=True)
         
         if data.empty:
             raise HTTPException(status_code=400, detail="Could not fetch market data for any symbols")
         
-        # Process price data
-        if len(symbols) == 1:
-            prices = pd.DataFrame({symbols[0]: data['Close']})
-        else:
-            prices = data['Close']
-        
-        # Remove symbols with insufficient data
-        valid_symbols = []
-        for symbol in symbols:
-            if symbol in prices.columns and len(prices[symbol].dropna()) > 50:
-                valid_symbols.append(symbol)
-            else:
-                logger.warning(f"Insufficient data for symbol: {symbol}")
+        # Process price data, removing symbols with insufficient data
+        prices, valid_symbols = _get_close_frame(data, symbols, min_points=50)
         
         if len(valid_symbols) < 2:
             raise HTTPException(status_code=400, detail="Need at least 2 assets with sufficient data for optimization")
         
         # Filter assets to valid symbols only
         valid_assets = [asset for asset in request.assets if asset.symbol in valid_symbols]
-        prices = prices[valid_symbols].dropna()
-        
-        # Calculate returns
-        returns = prices.pct_change().dropna()
-        
-        # Calculate current portfolio value and weights
-        current_prices = prices.iloc[-1]
-        current_values = {symbol: current_shares[symbol] * current_prices[symbol] for symbol in valid_symbols}
-        total_value = sum(current_values.values())
-        current_weights = np.array([current_values[symbol] / total_value for symbol in valid_symbols])
-        
-        # Calculate expected returns and covariance matrix
-        expected_returns = returns.mean() * 252  # Annualized
-        cov_matrix = returns.cov() * 252  # Annualized
+        price_matrix = prices[valid_symbols].ffill().dropna().to_numpy()
+        
+        # Calculate returns on the raw price matrix (gaps are already filled, so every row is complete)
+        returns = np.diff(price_matrix, axis=0) / price_matrix[:-1]
+        
+        # Calculate current portfolio value and weights (latest prices in valid_symbols order)
+        current_prices = price_matrix[-1]
+        shares_array = np.fromiter((current_shares[symbol] for symbol in valid_symbols),
+                                   dtype=np.float64, count=len(valid_symbols))
+        current_values = shares_array * current_prices
+        total_value = float(current_values.sum())
+        current_weights = current_values / total_value
+        
+        # Calculate expected returns and covariance matrix, as plain arrays in valid_symbols order so
+        # every objective evaluation in the optimizer is pure numpy with no index alignment
+        expected_returns = returns.mean(axis=0) * TRADING_DAYS  # Annualized
+        
+        # Sample covariance is noisy enough to push the optimizer into extreme weights, so it is
+        # shrunk towards a scaled identity by default; constraints={"shrinkage": "none"} opts out
+        if shrinkage == "ledoit_wolf":
+            cov_matrix = ledoit_wolf_covariance(returns) * TRADING_DAYS  # Annualized
+        else:
+            cov_matrix = np.cov(returns, rowvar=False) * TRADING_DAYS  # Annualized
         
         # Portfolio optimization function
         def portfolio_performance(weights, returns, cov_matrix):
@@ -757,7 +896,7 @@ async def optimize_portfolio(request: OptimizationRequest):
             portfolio_volatility = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
             return portfolio_return, portfolio_volatility
         
-        def negative_sharpe_ratio(weights, returns, cov_matrix, risk_free_rate=0.02):
+        def negative_sharpe_ratio(weights, returns, cov_matrix, risk_free_rate=RISK_FREE_RATE):
             p_return, p_volatility = portfolio_performance(weights, returns, cov_matrix)
             return -(p_return - risk_free_rate) / p_volatility
         
@@ -790,28 +929,51 @@ async def optimize_portfolio(request: OptimizationRequest):
         else:
             objective_func = negative_sharpe_ratio
         
-        # Optimize
-        initial_guess = np.array([1/num_assets] * num_assets)
-        result = minimize(
-            objective_func,
-            initial_guess,
-            args=(expected_returns, cov_matrix),
-            method='SLSQP',
-            bounds=bounds,
-            constraints=constraints
-        )
-        
-        if not result.success:
-            raise HTTPException(status_code=500, detail="Optimization failed to converge")
+        # Sharpe and volatility objectives have a closed-form optimum under the budget constraint alone
+        # (tangency: inv(S)(mu - rf), min variance: inv(S)1, each normalized to sum to 1). When that
+        # point already lies inside the weight bounds it is also the bounded optimum, so SLSQP is skipped
+        optimized_weights = None
+        if objective_func is not negative_return:
+            if objective_func is negative_sharpe_ratio:
+                target = expected_returns - RISK_FREE_RATE
+            else:
+                target = np.ones(num_assets)
+            try:
+                raw_weights = np.linalg.solve(cov_matrix, target)
+            except np.linalg.LinAlgError:
+                raw_weights = None
+            # A non-positive total means the tangency point sits on the inefficient side of the frontier
+            if raw_weights is not None and raw_weights.sum() > 0:
+                candidate = raw_weights / raw_weights.sum()
+                lower, upper = bounds[0]
+                if np.all(candidate >= lower - 1e-10) and np.all(candidate <= upper + 1e-10):
+                    optimized_weights = candidate
         
-        optimized_weights = result.x
+        # Optimize
+        if optimized_weights is None:
+            initial_guess = np.array([1/num_assets] * num_assets)
+            # SLSQP iterates in a worker thread so the event loop keeps serving other requests
+            result = await asyncio.to_thread(
+                minimize,
+                objective_func,
+                initial_guess,
+                args=(expected_returns, cov_matrix),
+                method='SLSQP',
+                bounds=bounds,
+                constraints=constraints
+            )
+            
+            if not result.success:
+                raise HTTPException(status_code=500, detail="Optimization failed to converge")
+            
+            optimized_weights = result.x
         
         # Calculate performance metrics
         current_return, current_volatility = portfolio_performance(current_weights, expected_returns, cov_matrix)
         optimized_return, optimized_volatility = portfolio_performance(optimized_weights, expected_returns, cov_matrix)
         
-        current_sharpe = (current_return - 0.02) / current_volatility if current_volatility > 0 else 0
-        optimized_sharpe = (optimized_return - 0.02) / optimized_volatility if optimized_volatility > 0 else 0
+        current_sharpe = (current_return - RISK_FREE_RATE) / current_volatility if current_volatility > 0 else 0
+        optimized_sharpe = (optimized_return - RISK_FREE_RATE) / optimized_volatility if optimized_volatility > 0 else 0
         
         # Generate allocation recommendations
         allocations = []
@@ -823,7 +985,7 @@ async def optimize_portfolio(request: OptimizationRequest):
             
             weight_diff = optimized_weight - current_weight
             value_to_trade = weight_diff * total_value
-            shares_to_trade = value_to_trade / current_prices[symbol]
+            shares_to_trade = value_to_trade / current_prices[i]
             
             if abs(weight_diff) > 0.01:  # Only suggest changes > 1%
                 action = "buy" if weight_diff > 0 else "sell"
@@ -859,7 +1021,8 @@ async def optimize_portfolio(request: OptimizationRequest):
         # Generate figure data
         current_weights_dict = {symbol: current_weights[i] for i, symbol in enumerate(valid_symbols)}
         optimized_weights_dict = {symbol: optimized_weights[i] for i, symbol in enumerate(valid_symbols)}
-        figure_data = generate_optimization_figure(
+        figure_data = await render_figure(
+            generate_optimization_figure,
             current_weights_dict,
             optimized_weights_dict,
             valid_symbols,
@@ -907,69 +1070,66 @@ async def run_monte_carlo_simulation(request: MonteCarloRequest):
         shares = {asset.symbol: asset.shares for asset in request.assets}
         
         # Fetch market data
-        data = yf.download(symbols, period="2y", progress=False, auto_adjust=True)
+        data = await fetch_market_data(symbols, "2y", use_cache=not request.nocache, auto_adjust=True)
         
         if data.empty:
             raise HTTPException(status_code=400, detail="Could not fetch market data")
         
-        # Process price data
-        if len(symbols) == 1:
-            prices = pd.DataFrame({symbols[0]: data['Close']})
-        else:
-            prices = data['Close']
+        # Process price data, removing symbols with insufficient data
+        prices, symbols = _get_close_frame(data, symbols, min_points=10)
+        
+        if not symbols:
+            raise HTTPException(status_code=400, detail="No valid market data found for any symbols")
         
-        # Calculate returns and portfolio weights
-        returns = prices.pct_change().dropna()
-        current_prices = prices.iloc[-1]
+        # Calculate returns on the raw price matrix (columns in symbols order to line up with weights),
+        # forward-filling gaps and dropping leading days before every symbol has a price
+        price_matrix = prices[symbols].ffill().to_numpy()
+        returns = np.diff(price_matrix, axis=0) / price_matrix[:-1]
+        returns = returns[~np.isnan(returns).any(axis=1)]
+        current_prices = price_matrix[-1]
         
         # Calculate portfolio weights
-        portfolio_values = {symbol: shares[symbol] * current_prices[symbol] for symbol in symbols}
-        total_value = sum(portfolio_values.values())
-        weights = np.array([portfolio_values[symbol] / total_value for symbol in symbols])
+        shares_array = np.fromiter((shares[symbol] for symbol in symbols), dtype=np.float64, count=len(symbols))
+        position_values = shares_array * current_prices
+        weights = position_values / position_values.sum()
         
-        # Calculate portfolio statistics
-        portfolio_returns = (returns * weights).sum(axis=1)
-        mean_return = portfolio_returns.mean()
-        std_return = portfolio_returns.std()
+        # Per-asset daily return statistics
+        mean_returns = returns.mean(axis=0)
+        cov_matrix = np.atleast_2d(np.cov(returns, rowvar=False))
         
         # Run Monte Carlo simulation
-        np.random.seed(42)  # For reproducible results
-        simulations = []
-        
-        for _ in range(request.simulations):
-            # Generate random returns for each year
-            random_returns = np.random.normal(mean_return, std_return, 252 * request.time_horizon_years)
-            
-            # Calculate cumulative value
-            cumulative_returns = np.cumprod(1 + random_returns)
-            final_value = request.initial_investment * cumulative_returns[-1]
-            simulations.append(final_value)
-        
-        simulations = np.array(simulations)
-        
-        # Calculate percentiles and statistics
-        percentiles = {
-            "5th": float(np.percentile(simulations, 5)),
-            "25th": float(np.percentile(simulations, 25)),
-            "50th": float(np.percentile(simulations, 50)),
-            "75th": float(np.percentile(simulations, 75)),
-            "95th": float(np.percentile(simulations, 95))
-        }
-        
-        probability_of_loss = float(np.sum(simulations < request.initial_investment) / len(simulations))
+        rng = np.random.default_rng(42)  # For reproducible results, without touching global RNG state
+        steps = TRADING_DAYS * request.time_horizon_years
+        
+        # Only terminal values are reported, so draw each asset's total log growth directly from
+        # N(steps*(mu - sigma^2/2), steps*cov); correlating the draws through a factor of the
+        # covariance keeps diversification between holdings in the simulated outcomes
+        drift = steps * (mean_returns - 0.5 * np.diag(cov_matrix))
+        shocks = rng.standard_normal((request.simulations, len(symbols)))
+        log_growth = drift + np.sqrt(steps) * (shocks @ covariance_factor(cov_matrix).T)
+        simulations = request.initial_investment * (np.exp(log_growth) @ weights)
+        
+        # Calculate percentiles (one selection pass for all five) and statistics
+        percentiles = dict(zip(
+            ["5th", "25th", "50th", "75th", "95th"],
+            np.percentile(simulations, [5, 25, 50, 75, 95]).tolist()
+        ))
+        
+        probability_of_loss = float((simulations < request.initial_investment).mean())
         expected_final_value = float(np.mean(simulations))
         worst_case = float(np.min(simulations))
         best_case = float(np.max(simulations))
         
         # Generate chart data for visualization
         chart_data = {
-            "simulation_results": simulations.tolist()[:1000],  # Limit for frontend
+            "simulation_results": simulations[:1000].tolist(),  # Limit for frontend
             "percentile_bands": list(percentiles.values())
         }
         
         # Generate figure data
-        figure_data = generate_monte_carlo_figure(
-            simulations.tolist(),
+        figure_data = await render_figure(
+            generate_monte_carlo_figure,
+            simulations,
             percentiles,
             request.time_horizon_years
         )
@@ -993,6 +1153,32 @@ async def run_monte_carlo_simulation(request: MonteCarloRequest):
         logger.error(f"Error running Monte Carlo simulation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Monte Carlo simulation failed: {str(e)}")
 
+def covariance_factor(cov_matrix: np.ndarray) -> np.ndarray:
+    """Return L with L @ L.T == cov_matrix, tolerating singular covariances"""
+    try:
+        return np.linalg.cholesky(cov_matrix)
+    except np.linalg.LinAlgError:
+        # Perfectly correlated or constant series leave the matrix only semi-definite
+        eigenvalues, eigenvectors = np.linalg.eigh(cov_matrix)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+
+def ledoit_wolf_covariance(returns: np.ndarray) -> np.ndarray:
+    """Ledoit-Wolf shrunk covariance of a (days, assets) return matrix (same estimator as sklearn's LedoitWolf)"""
+    n_days, n_assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+    sample_cov = centered.T @ centered / n_days
+    
+    # Shrinkage target is the identity scaled to the average variance
+    mu = np.trace(sample_cov) / n_assets
+    squared = centered ** 2
+    delta = (np.sum(sample_cov ** 2) - 2 * mu * np.trace(sample_cov) + n_assets * mu ** 2) / n_assets
+    beta = (np.sum(squared.T @ squared) / n_days - np.sum(sample_cov ** 2)) / (n_assets * n_days)
+    shrinkage = 0.0 if delta == 0 else min(beta, delta) / delta
+    
+    shrunk = (1 - shrinkage) * sample_cov
+    shrunk.flat[::n_assets + 1] += shrinkage * mu
+    return shrunk
+
 @app.post("/market/sentiment", response_model=MarketSentimentResponse)
 async def analyze_market_sentiment(request: SentimentRequest):
     """Analyze market sentiment for given symbols using news and social media data"""
@@ -1005,21 +1191,28 @@ async def analyze_market_sentiment(request: SentimentRequest):
         stock_sentiments = []
         total_sentiment = 0
         total_confidence = 0
-        sentiment_counts = {"positive": 0, "negative": 0, "neutral": 0}
+        categories = []  # index into SENTIMENT_CATEGORIES per symbol
+        
+        # Company info lookups are independent network calls, so issue them all at once
+        company_names = await asyncio.gather(
+            *(asyncio.to_thread(lookup_company_name, symbol) for symbol in request.symbols),
+            return_exceptions=True
+        )
+        
+        # Simulate sentiment analysis and label the scores in one batch (in production, you'd use real news APIs)
+        simulated = simulate_sentiment_analysis_batch(request.symbols, request.time_range)
+        scores = np.array([sentiment['sentiment_score'] for sentiment in simulated])
+        labels = get_sentiment_label(scores)
+        score_categories = np.select([scores > 0.1, scores < -0.1], [POSITIVE, NEGATIVE], default=NEUTRAL)
+        simulated_sentiments = dict(zip(request.symbols, zip(simulated, labels.tolist(), score_categories.tolist())))
         
         # Analyze sentiment for each symbol
-        for symbol in request.symbols:
+        for symbol, company_name in zip(request.symbols, company_names):
             try:
-                # Get company info from yfinance
-                ticker = yf.Ticker(symbol)
-                info = ticker.info
-                company_name = info.get('longName', symbol)
-                
-                # Simulate sentiment analysis (in production, you'd use real news APIs)
-                sentiment_data = await simulate_sentiment_analysis(symbol, company_name, request.time_range)
+                if isinstance(company_name, Exception):
+                    raise company_name
                 
-                # Calculate sentiment label
-                sentiment_label = get_sentiment_label(sentiment_data['sentiment_score'])
+                sentiment_data, sentiment_label, category = simulated_sentiments[symbol]
                 
                 stock_sentiment = StockSentiment(
                     symbol=symbol,
@@ -1036,13 +1229,7 @@ async def analyze_market_sentiment(request: SentimentRequest):
                 total_sentiment += sentiment_data['sentiment_score'] * sentiment_data['confidence']
                 total_confidence += sentiment_data['confidence']
                 
-                # Count sentiment distribution
-                if sentiment_data['sentiment_score'] > 0.1:
-                    sentiment_counts["positive"] += 1
-                elif sentiment_data['sentiment_score'] < -0.1:
-                    sentiment_counts["negative"] += 1
-                else:
-                    sentiment_counts["neutral"] += 1
+                categories.append(category)
                     
             except Exception as e:
                 logger.warning(f"Error analyzing sentiment for {symbol}: {e}")
@@ -1055,7 +1242,10 @@ async def analyze_market_sentiment(request: SentimentRequest):
                     key_themes=["analysis_failed"],
                     sentiment_label="Neutral"
                 ))
-                sentiment_counts["neutral"] += 1
+                categories.append(NEUTRAL)
+        
+        # Sentiment distribution as a (positive, negative, neutral) count vector
+        sentiment_counts = np.bincount(categories, minlength=len(SENTIMENT_CATEGORIES))
         
         # Calculate overall sentiment
         overall_sentiment = total_sentiment / total_confidence if total_confidence > 0 else 0
@@ -1070,7 +1260,7 @@ async def analyze_market_sentiment(request: SentimentRequest):
         response = MarketSentimentResponse(
             overall_sentiment=round(overall_sentiment, 3),
             overall_confidence=round(overall_confidence, 3),
-            sentiment_distribution=sentiment_counts,
+            sentiment_distribution=dict(zip(SENTIMENT_CATEGORIES, sentiment_counts.tolist())),
             stock_sentiments=stock_sentiments,
             market_fear_greed_index=fear_greed_index,
             analysis_timestamp=datetime.now().isoformat(),
@@ -1085,62 +1275,91 @@ async def analyze_market_sentiment(request: SentimentRequest):
         raise HTTPException(status_code=500, detail=f"Sentiment analysis failed: {str(e)}")
 
 # Helper functions for sentiment analysis
-async def simulate_sentiment_analysis(symbol: str, company_name: str, time_range: str) -> Dict:
-    """Simulate sentiment analysis (replace with real API calls in production)"""
-    import random
-    import hashlib
-    
-    # Use symbol hash for consistent results
-    seed = int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16)
-    random.seed(seed)
-    
-    # Simulate different sentiment patterns based on symbol
-    base_sentiment = random.uniform(-0.3, 0.3)
-    
-    # Add some market-wide effects
-    market_effect = random.uniform(-0.2, 0.2)
-    
-    # Simulate news volume based on company size (approximated by symbol length)
-    news_count = random.randint(5, 50)
-    
-    # Simulate key themes
-    themes = ["earnings", "growth", "market_trends", "analyst_coverage", "regulatory", "competition"]
-    key_themes = random.sample(themes, random.randint(2, 4))
+def lookup_company_name(symbol: str) -> str:
+    """Fetch a symbol's long name from yfinance (blocking network call)"""
+    import yfinance as yf
+    return yf.Ticker(symbol).info.get('longName', symbol)
+
+# Simulated sentiment per (symbol, time_range); only touched from the event loop, so no lock is needed
+SENTIMENT_CACHE_SIZE = 4096
+_sentiment_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+SENTIMENT_THEMES = ("earnings", "growth", "market_trends", "analyst_coverage", "regulatory", "competition")
+# Every 2-4 theme subset, so picking a symbol's themes is one index into a prebuilt tuple
+SENTIMENT_THEME_SUBSETS = {count: tuple(combinations(SENTIMENT_THEMES, count)) for count in (2, 3, 4)}
+# Number of subsets for each theme count, indexed directly by the per-symbol count array
+SENTIMENT_THEME_SUBSET_COUNTS = np.array([len(SENTIMENT_THEME_SUBSETS.get(count, ())) for count in range(5)])
+
+def _hash_uniforms(seeds: np.ndarray, count: int) -> np.ndarray:
+    """(len(seeds), count) uniforms in [0, 1), a fixed function of each seed (splitmix64 over seed + column)"""
+    with np.errstate(over='ignore'):
+        z = seeds[:, None] * np.uint64(0x9E3779B97F4A7C15) + np.arange(1, count + 1, dtype=np.uint64)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)) * 2.0 ** -53
+
+def simulate_sentiment_analysis_batch(symbols: List[str], time_range: str) -> List[Dict]:
+    """Simulate sentiment analysis for all symbols at once (replace with real API calls in production)"""
+    # Results are a pure function of (symbol, time_range), so only symbols not seen before are simulated
+    missing = [symbol for symbol in dict.fromkeys(symbols) if (symbol, time_range) not in _sentiment_cache]
     
-    # Calculate final sentiment
-    final_sentiment = np.clip(base_sentiment + market_effect, -1, 1)
-    confidence = random.uniform(0.6, 0.9)
+    if missing:
+        # Each symbol's draws depend only on its own checksum, so results are consistent across requests
+        # (no cryptographic property is needed; splitmix64 below mixes the bits)
+        seeds = np.fromiter((zlib.crc32(symbol.encode()) for symbol in missing), dtype=np.uint64, count=len(missing))
+        draws = _hash_uniforms(seeds, 6)
+        
+        # Simulate different sentiment patterns based on symbol, plus some market-wide effects
+        base_sentiment = -0.3 + 0.6 * draws[:, 0]
+        market_effect = -0.2 + 0.4 * draws[:, 1]
+        final_sentiment = np.clip(base_sentiment + market_effect, -1, 1)
+        confidence = 0.6 + 0.3 * draws[:, 2]
+        
+        # Simulate news volume (5-50 articles) and a random subset of 2-4 key themes
+        news_count = 5 + (draws[:, 3] * 46).astype(np.int64)
+        theme_count = 2 + (draws[:, 4] * 3).astype(np.int64)
+        theme_subset = (draws[:, 5] * SENTIMENT_THEME_SUBSET_COUNTS[theme_count]).astype(np.int64)
+        
+        # Themes are stored as tuples so cached entries cannot be mutated through a response
+        for symbol, score, conf, count, themes, subset in zip(
+            missing, final_sentiment.tolist(), confidence.tolist(), news_count.tolist(),
+            theme_count.tolist(), theme_subset.tolist()
+        ):
+            _sentiment_cache[(symbol, time_range)] = {
+                "sentiment_score": score,
+                "confidence": conf,
+                "news_count": count,
+                "key_themes": SENTIMENT_THEME_SUBSETS[themes][subset]
+            }
     
-    return {
-        "sentiment_score": final_sentiment,
-        "confidence": confidence,
-        "news_count": news_count,
-        "key_themes": key_themes
-    }
+    results = []
+    for symbol in symbols:
+        _sentiment_cache.move_to_end((symbol, time_range))
+        results.append(_sentiment_cache[(symbol, time_range)])
+    while len(_sentiment_cache) > SENTIMENT_CACHE_SIZE:
+        _sentiment_cache.popitem(last=False)
+    return results
 
-def get_sentiment_label(sentiment_score: float) -> str:
-    """Convert sentiment score to human-readable label"""
-    if sentiment_score > 0.4:
-        return "Very Positive"
-    elif sentiment_score > 0.1:
-        return "Positive"
-    elif sentiment_score > -0.1:
-        return "Neutral"
-    elif sentiment_score > -0.4:
-        return "Negative"
-    else:
-        return "Very Negative"
+# Sentiment distribution buckets, in response order; counts travel as an array indexed by these
+SENTIMENT_CATEGORIES = ("positive", "negative", "neutral")
+POSITIVE, NEGATIVE, NEUTRAL = range(len(SENTIMENT_CATEGORIES))
+
+SENTIMENT_LABELS = np.array(["Very Negative", "Negative", "Neutral", "Positive", "Very Positive"])
+SENTIMENT_LABEL_THRESHOLDS = np.array([-0.4, -0.1, 0.1, 0.4])  # a score must exceed a threshold to move up a label
+
+def get_sentiment_label(sentiment_scores: np.ndarray) -> np.ndarray:
+    """Convert sentiment scores to human-readable labels"""
+    return SENTIMENT_LABELS[np.searchsorted(SENTIMENT_LABEL_THRESHOLDS, sentiment_scores, side='left')]
 
-def calculate_fear_greed_index(overall_sentiment: float, sentiment_counts: Dict[str, int]) -> float:
+def calculate_fear_greed_index(overall_sentiment: float, sentiment_counts: np.ndarray) -> float:
     """Calculate Fear & Greed Index based on sentiment data"""
     # Convert sentiment to 0-100 scale (50 is neutral)
     base_score = 50 + (overall_sentiment * 30)
     
     # Adjust based on sentiment distribution
-    total_stocks = sum(sentiment_counts.values())
+    total_stocks = int(sentiment_counts.sum())
     if total_stocks > 0:
-        positive_ratio = sentiment_counts["positive"] / total_stocks
-        negative_ratio = sentiment_counts["negative"] / total_stocks
+        positive_ratio, negative_ratio, _ = (sentiment_counts / total_stocks).tolist()
         
         # Boost or reduce based on consensus
         if positive_ratio > 0.7:  # Strong positive consensus
@@ -1148,43 +1367,72 @@ def calculate_fear_greed_index(overall_sentiment: float, sentiment_counts: Dict[
         elif negative_ratio > 0.7:  # Strong negative consensus
             base_score -= 15
     
-    return round(np.clip(base_score, 0, 100), 1)
+    return round(max(0.0, min(100.0, base_score)), 1)
 
-def generate_sentiment_recommendations(overall_sentiment: float, fear_greed_index: float, sentiment_counts: Dict[str, int]) -> List[str]:
+# Recommendation tables, indexed by which side of each threshold pair a value falls on (see _bucket).
+# Each bucket is a tuple of recommendations, empty where that signal has nothing to add.
+SENTIMENT_RECOMMENDATIONS = (
+    ("Market sentiment is strongly negative. Consider defensive positioning or value opportunities.",),
+    ("Market sentiment is negative. Focus on quality stocks and risk management.",),
+    ("Market sentiment is neutral. Focus on fundamental analysis for stock selection.",),
+    ("Market sentiment is positive. Good environment for growth investments.",),
+    ("Market sentiment is strongly positive. Consider taking profits on overvalued positions.",),
+)
+FEAR_GREED_RECOMMENDATIONS = (
+    ("Fear & Greed Index shows extreme fear. May be a good time to find value opportunities.",),
+    (),
+    ("Fear & Greed Index shows extreme greed. Consider reducing risk exposure.",),
+)
+CONSENSUS_RECOMMENDATIONS = (
+    ("Low positive sentiment. Market may be overly pessimistic about opportunities.",),
+    (),
+    ("Very high positive sentiment consensus. Watch for potential market overconfidence.",),
+)
+
+# (lower, upper) thresholds for each table above
+SENTIMENT_RECOMMENDATION_THRESHOLDS = ((-0.3, -0.1), (0.1, 0.3))
+FEAR_GREED_RECOMMENDATION_THRESHOLDS = ((25,), (75,))
+CONSENSUS_RECOMMENDATION_THRESHOLDS = ((0.2,), (0.8,))
+
+def _bucket(value: float, lower: Tuple[float, ...], upper: Tuple[float, ...]) -> int:
+    """Count the lower thresholds value reaches and the upper thresholds it strictly exceeds"""
+    return bisect.bisect_right(lower, value) + bisect.bisect_left(upper, value)
+
+def generate_sentiment_recommendations(overall_sentiment: float, fear_greed_index: float, sentiment_counts: np.ndarray) -> List[str]:
     """Generate actionable recommendations based on sentiment analysis"""
-    recommendations = []
-    
-    # Overall sentiment recommendations
-    if overall_sentiment > 0.3:
-        recommendations.append("Market sentiment is strongly positive. Consider taking profits on overvalued positions.")
-    elif overall_sentiment > 0.1:
-        recommendations.append("Market sentiment is positive. Good environment for growth investments.")
-    elif overall_sentiment < -0.3:
-        recommendations.append("Market sentiment is strongly negative. Consider defensive positioning or value opportunities.")
-    elif overall_sentiment < -0.1:
-        recommendations.append("Market sentiment is negative. Focus on quality stocks and risk management.")
-    else:
-        recommendations.append("Market sentiment is neutral. Focus on fundamental analysis for stock selection.")
+    # Overall sentiment: below -0.3, below -0.1, neutral, above 0.1, above 0.3
+    overall = SENTIMENT_RECOMMENDATIONS[_bucket(overall_sentiment, *SENTIMENT_RECOMMENDATION_THRESHOLDS)]
     
-    # Fear & Greed Index recommendations
-    if fear_greed_index > 75:
-        recommendations.append("Fear & Greed Index shows extreme greed. Consider reducing risk exposure.")
-    elif fear_greed_index < 25:
-        recommendations.append("Fear & Greed Index shows extreme fear. May be a good time to find value opportunities.")
+    # Fear & Greed Index: below 25 or above 75
+    fear_greed = FEAR_GREED_RECOMMENDATIONS[_bucket(fear_greed_index, *FEAR_GREED_RECOMMENDATION_THRESHOLDS)]
     
-    # Sentiment distribution recommendations
-    total_stocks = sum(sentiment_counts.values())
+    # Sentiment distribution: positive ratio below 0.2 or above 0.8
+    consensus = ()
+    total_stocks = int(sentiment_counts.sum())
     if total_stocks > 0:
-        positive_ratio = sentiment_counts["positive"] / total_stocks
-        if positive_ratio > 0.8:
-            recommendations.append("Very high positive sentiment consensus. Watch for potential market overconfidence.")
-        elif positive_ratio < 0.2:
-            recommendations.append("Low positive sentiment. Market may be overly pessimistic about opportunities.")
+        positive_ratio = int(sentiment_counts[POSITIVE]) / total_stocks
+        consensus = CONSENSUS_RECOMMENDATIONS[_bucket(positive_ratio, *CONSENSUS_RECOMMENDATION_THRESHOLDS)]
     
-    return recommendations[:5]  # Limit to 5 recommendations
+    return list((*overall, *fear_greed, *consensus)[:5])  # Limit to 5 recommendations
 
 if __name__ == "__main__":
     import uvicorn
-    import os
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # uvloop/httptools ship with uvicorn[standard]. The import string lets uvicorn spawn workers;
+    # in containers, `gunicorn -k uvicorn.workers.UvicornWorker --preload main:app` also shares
+    # the imported modules across workers. Access logs are off since log_requests covers them.
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    if workers > 1:
+        # One BLAS/OpenMP thread per worker process; with a pool per worker they oversubscribe the cores.
+        # Workers are spawned fresh, so numpy picks these up when each of them imports it
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ.setdefault(var, "1")
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+    )
\ No newline at end of file
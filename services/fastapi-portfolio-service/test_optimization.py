@@ -3,14 +3,39 @@
 Test script for portfolio optimization endpoint
 """
 
+import asyncio
+import functools
 import json
-from main import app
-from fastapi.testclient import TestClient
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+from main import app, ledoit_wolf_covariance
 
-def test_portfolio_optimization():
+# Fixed daily returns (days, assets) and the covariance sklearn.covariance.LedoitWolf (assume_centered=False)
+# gives for them, so the estimator is checked even where scikit-learn isn't installed
+LEDOIT_WOLF_RETURNS = np.array([
+    [0.012, -0.004, 0.007],
+    [-0.008, 0.003, -0.011],
+    [0.005, 0.010, 0.002],
+    [0.015, -0.006, 0.009],
+    [-0.002, 0.001, -0.004],
+    [0.007, 0.008, 0.013],
+    [-0.011, -0.002, -0.006],
+    [0.004, 0.005, 0.001],
+])
+LEDOIT_WOLF_EXPECTED = np.array([
+    [6.717806459045236e-05, -4.9453337396610664e-06, 3.93683118227167e-05],
+    [-4.9453337396610664e-06, 3.6026781099355914e-05, 1.187743911272317e-07],
+    [3.93683118227167e-05, 1.187743911272317e-07, 5.632640431019172e-05],
+])
+
+def make_client() -> httpx.AsyncClient:
+    """In-process client: requests go straight to the ASGI app, so endpoints can run concurrently"""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+async def check_portfolio_optimization(client: httpx.AsyncClient):
     """Test the portfolio optimization endpoint"""
-    client = TestClient(app)
-    
     # Test data - simple portfolio
     test_data = {
         "assets": [
@@ -25,37 +50,28 @@ def test_portfolio_optimization():
     print("Testing portfolio optimization endpoint...")
     print(f"Request data: {json.dumps(test_data, indent=2)}")
     
-    try:
-        response = client.post("/portfolio/optimize", json=test_data)
-        print(f"Response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            result = response.json()
-            print("✅ Optimization endpoint works!")
-            print(f"Expected Return: {result['expected_return']}%")
-            print(f"Expected Volatility: {result['expected_volatility']}%")
-            print(f"Sharpe Ratio: {result['sharpe_ratio']}")
-            print(f"Rebalancing Cost: ${result['rebalancing_cost_estimate']}")
-            
-            # Show top recommendations
-            print("\nTop Recommendations:")
-            for allocation in result['allocations'][:3]:
-                if allocation['recommended_action'] != 'hold':
-                    print(f"  {allocation['recommended_action'].upper()} {allocation['symbol']}: {allocation['shares_to_trade']} shares")
-            
-            return True
-        else:
-            print(f"❌ Error: {response.status_code} - {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Test failed: {e}")
-        return False
+    response = await client.post("/portfolio/optimize", json=test_data)
+    print(f"Response status: {response.status_code}")
+    assert response.status_code == 200, f"{response.status_code} - {response.text}"
+    
+    result = response.json()
+    assert {"expected_return", "expected_volatility", "sharpe_ratio", "allocations"} <= result.keys()
+    assert sorted(allocation['symbol'] for allocation in result['allocations']) == ["AAPL", "GOOGL", "MSFT"]
+    assert abs(sum(allocation['optimized_weight'] for allocation in result['allocations']) - 100) < 0.1  # percent
+    print("✅ Optimization endpoint works!")
+    print(f"Expected Return: {result['expected_return']}%")
+    print(f"Expected Volatility: {result['expected_volatility']}%")
+    print(f"Sharpe Ratio: {result['sharpe_ratio']}")
+    print(f"Rebalancing Cost: ${result['rebalancing_cost_estimate']}")
+    
+    # Show top recommendations
+    print("\nTop Recommendations:")
+    for allocation in result['allocations'][:3]:
+        if allocation['recommended_action'] != 'hold':
+            print(f"  {allocation['recommended_action'].upper()} {allocation['symbol']}: {allocation['shares_to_trade']} shares")
 
-def test_monte_carlo():
+async def check_monte_carlo(client: httpx.AsyncClient):
     """Test the Monte Carlo simulation endpoint"""
-    client = TestClient(app)
-    
     # Test data - simple portfolio
     test_data = {
         "assets": [
@@ -70,40 +86,105 @@ def test_monte_carlo():
     print("\nTesting Monte Carlo simulation endpoint...")
     print(f"Request data: {json.dumps(test_data, indent=2)}")
     
-    try:
-        response = client.post("/portfolio/monte-carlo", json=test_data)
-        print(f"Response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            result = response.json()
-            print("✅ Monte Carlo endpoint works!")
-            print(f"Expected Final Value: ${result['expected_final_value']:,.2f}")
-            print(f"Probability of Loss: {result['probability_of_loss']:.1%}")
-            print(f"50th Percentile: ${result['percentile_outcomes']['50th']:,.2f}")
-            print(f"5th Percentile: ${result['percentile_outcomes']['5th']:,.2f}")
-            print(f"95th Percentile: ${result['percentile_outcomes']['95th']:,.2f}")
-            
-            return True
-        else:
-            print(f"❌ Error: {response.status_code} - {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Test failed: {e}")
-        return False
+    response = await client.post("/portfolio/monte-carlo", json=test_data)
+    print(f"Response status: {response.status_code}")
+    assert response.status_code == 200, f"{response.status_code} - {response.text}"
+    
+    result = response.json()
+    percentiles = result['percentile_outcomes']
+    assert percentiles['5th'] <= percentiles['50th'] <= percentiles['95th']
+    assert 0 <= result['probability_of_loss'] <= 1
+    assert result['expected_final_value'] > 0
+    print("✅ Monte Carlo endpoint works!")
+    print(f"Expected Final Value: ${result['expected_final_value']:,.2f}")
+    print(f"Probability of Loss: {result['probability_of_loss']:.1%}")
+    print(f"50th Percentile: ${percentiles['50th']:,.2f}")
+    print(f"5th Percentile: ${percentiles['5th']:,.2f}")
+    print(f"95th Percentile: ${percentiles['95th']:,.2f}")
+
+def make_price_frame(symbols, last_close: float) -> pd.DataFrame:
+    """Three daily bars in yf.download's (Price, Ticker) layout, every symbol closing at last_close on the newest one"""
+    index = pd.bdate_range(end="2024-01-05", periods=3, name="Date")
+    bars = pd.DataFrame({symbol: [100.0, 101.0, last_close] for symbol in symbols}, index=index)
+    return pd.concat({field: bars for field in ("Open", "High", "Low", "Close", "Volume")}, axis=1, names=["Price", "Ticker"])
+
+async def check_market_data_etag(client: httpx.AsyncClient, bars: dict):
+    """Test conditional requests on the market data endpoint; bars["last_close"] drives the stubbed download"""
+    test_data = {"symbols": ["AAPL", "MSFT"], "period": "5d"}
+    
+    print("\nTesting market data ETag handling...")
+    first = await client.post("/portfolio/market-data", json=test_data)
+    assert first.status_code == 200, f"{first.status_code} - {first.text}"
+    etag = first.headers.get("etag")
+    assert etag, "200 response carries no ETag"
+    
+    # Nothing changed: a conditional repeat gets a bodiless 304 with the same tag
+    repeat = await client.post("/portfolio/market-data", json=test_data, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304, f"{repeat.status_code} - {repeat.text}"
+    assert repeat.content == b""
+    assert repeat.headers.get("etag") == etag
+    
+    # The newest bar moves intraday: the old tag no longer matches
+    bars["last_close"] += 1.0
+    updated = await client.post("/portfolio/market-data", json=test_data, headers={"If-None-Match": etag})
+    assert updated.status_code == 200, f"{updated.status_code} - {updated.text}"
+    assert updated.headers.get("etag") not in (None, etag)
+    
+    # A different symbol set over the same bars is a different resource
+    other = await client.post("/portfolio/market-data", json={**test_data, "symbols": ["AAPL"]},
+                              headers={"If-None-Match": updated.headers["etag"]})
+    assert other.status_code == 200, f"{other.status_code} - {other.text}"
+    assert other.headers.get("etag") not in (None, etag, updated.headers["etag"])
+    print("✅ Market data ETag handling works!")
+
+async def run_checks(*checks):
+    """Run endpoint checks concurrently over one shared client; failed checks come back as exceptions"""
+    async with make_client() as client:
+        return await asyncio.gather(*(check(client) for check in checks), return_exceptions=True)
+
+def run_check(check):
+    """Run a single check, re-raising its failure so pytest reports it"""
+    result, = asyncio.run(run_checks(check))
+    if isinstance(result, BaseException):
+        raise result
+
+def test_portfolio_optimization():
+    """pytest entry point for check_portfolio_optimization"""
+    run_check(check_portfolio_optimization)
+
+def test_monte_carlo():
+    """pytest entry point for check_monte_carlo"""
+    run_check(check_monte_carlo)
+
+def test_market_data_etag(monkeypatch):
+    """pytest entry point for check_market_data_etag, with the yfinance download stubbed out"""
+    bars = {"last_close": 102.0}
+    monkeypatch.setattr("main.download_market_data",
+                        lambda symbols, period, use_cache=True, **kwargs: make_price_frame(sorted(set(symbols)), bars["last_close"]))
+    run_check(functools.partial(check_market_data_etag, bars=bars))
+
+def test_ledoit_wolf_covariance():
+    """ledoit_wolf_covariance should reproduce sklearn's LedoitWolf on a fixed return matrix"""
+    np.testing.assert_allclose(ledoit_wolf_covariance(LEDOIT_WOLF_RETURNS), LEDOIT_WOLF_EXPECTED, rtol=1e-10, atol=1e-16)
+
+def test_ledoit_wolf_matches_sklearn():
+    """ledoit_wolf_covariance should agree with sklearn's LedoitWolf on random data (skipped without sklearn)"""
+    covariance = pytest.importorskip("sklearn.covariance")
+
+    returns = np.random.default_rng(0).normal(0.0005, 0.02, size=(250, 4))
+    expected = covariance.LedoitWolf().fit(returns).covariance_
+    np.testing.assert_allclose(ledoit_wolf_covariance(returns), expected, rtol=1e-10, atol=1e-14)
 
 if __name__ == "__main__":
     print("🚀 Testing FastAPI Portfolio Optimization Service")
     print("=" * 60)
     
-    success_count = 0
-    total_tests = 2
-    
-    if test_portfolio_optimization():
-        success_count += 1
-    
-    if test_monte_carlo():
-        success_count += 1
+    results = asyncio.run(run_checks(check_portfolio_optimization, check_monte_carlo))
+    for result in results:
+        if isinstance(result, BaseException):
+            print(f"❌ Test failed: {result!r}")
+    success_count = sum(not isinstance(result, BaseException) for result in results)
+    total_tests = len(results)
     
     print("=" * 60)
     print(f"Tests completed: {success_count}/{total_tests} passed")
@@ -6,11 +6,9 @@ Shows how easy it is to add new analysis capabilities
 import json
 from typing import Dict, Any
 from datetime import datetime
-import sys
 import os
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+# Loaded by GenericMCPServer, whose directory is already importable
 from generic_mcp_server import BaseAnalyzer, mcp_analyzer, mcp_tool, mcp_resource
 
 @mcp_analyzer
@@ -29,7 +27,7 @@ class ExampleAnalyzer(BaseAnalyzer):
             "example_metric": 42,
             "timestamp": datetime.now().isoformat()
         }
-        return json.dumps(data, indent=2)
+        return json.dumps(data, separators=(',', ':'))
     
     @mcp_tool
     def tool_example_analysis(self, user_id: str, parameter: str = "default") -> Dict[str, Any]:
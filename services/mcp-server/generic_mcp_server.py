@@ -5,6 +5,7 @@ Extensible architecture for adding any type of analysis tools
 """
 
 import os
+import sys
 import json
 import importlib
 import logging
@@ -14,6 +15,7 @@ from pathlib import Path
 
 # Third-party imports
 from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
 # MCP imports
@@ -31,6 +33,9 @@ logger = logging.getLogger(__name__)
 class GenericMCPServer:
     """Generic MCP Server that can load and register any type of tools"""
     
+    # Loaded analyzer modules by resolved path -> (mtime_ns, module), shared across servers
+    _analyzer_module_cache: Dict[str, tuple] = {}
+    
     def __init__(self, server_name: str = "GenericTools"):
         self.mcp = FastMCP(server_name)
         self.tools = {}
@@ -40,8 +45,20 @@ class GenericMCPServer:
         # Database connection (optional)
         self.database_url = os.getenv("DATABASE_URL")
         self.engine = None
+        self.SessionLocal = None
         if self.database_url:
-            self.engine = create_engine(self.database_url)
+            # Pooled connections are checked before use and recycled hourly so idle ones
+            # dropped by the database server don't fail the next tool call. The pool is sized
+            # for concurrent tool calls rather than the default 5 + 10 overflow.
+            self.engine = create_engine(
+                self.database_url,
+                pool_size=int(os.getenv("DB_POOL_SIZE", 20)),
+                max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+                pool_pre_ping=True,
+                pool_recycle=3600
+            )
+            # One session factory for every analyzer, built once here instead of per query
+            self.SessionLocal = sessionmaker(bind=self.engine, expire_on_commit=False)
             logger.info("Database connection initialized")
     
     def register_analyzer(self, name: str, analyzer_class):
@@ -52,6 +69,10 @@ class GenericMCPServer:
                 analyzer = analyzer_class(database_engine=self.engine)
             else:
                 analyzer = analyzer_class()
+            
+            # Share the session factory without changing analyzer constructor signatures
+            if self.SessionLocal and isinstance(analyzer, BaseAnalyzer):
+                analyzer.Session = self.SessionLocal
                 
             self.analyzers[name] = analyzer
             
@@ -64,93 +85,102 @@ class GenericMCPServer:
         except Exception as e:
             logger.error(f"Failed to register analyzer {name}: {e}")
     
+    @staticmethod
+    def _scan_analyzer_class(analyzer_class) -> tuple:
+        """Return the (tool names, resource names) an analyzer class exposes"""
+        # @mcp_analyzer records these when the class is defined; plain classes registered by
+        # hand are scanned on first use instead
+        cached = analyzer_class.__dict__.get('_mcp_registration_cache')
+        if cached is None:
+            cached = _scan_mcp_methods(analyzer_class)
+            analyzer_class._mcp_registration_cache = cached
+        return cached
+    
     def _register_analyzer_tools(self, analyzer_name: str, analyzer):
         """Register all tools from an analyzer"""
-        # Look for methods decorated with @tool or starting with 'tool_'
-        for attr_name in dir(analyzer):
-            if attr_name.startswith('tool_') or hasattr(getattr(analyzer, attr_name), '_is_mcp_tool'):
-                method = getattr(analyzer, attr_name)
-                
-                # Create MCP tool wrapper
-                @self.mcp.tool()
-                def tool_wrapper(*args, **kwargs):
-                    return method(*args, **kwargs)
-                
-                # Copy metadata
-                tool_wrapper.__name__ = f"{analyzer_name}_{attr_name}"
-                tool_wrapper.__doc__ = method.__doc__
-                
-                self.tools[f"{analyzer_name}_{attr_name}"] = tool_wrapper
+        # Methods decorated with @mcp_tool or starting with 'tool_'
+        tool_names, _ = self._scan_analyzer_class(type(analyzer))
+        for attr_name in tool_names:
+            method = getattr(analyzer, attr_name)
+            tool_name = f"{analyzer_name}_{attr_name}"
+            
+            # Register the bound method itself: FastMCP derives the argument schema from its
+            # signature, and there is no per-iteration closure to capture the wrong method
+            self.mcp.tool(name=tool_name, description=method.__doc__)(method)
+            self.tools[tool_name] = method
     
     def _register_analyzer_resources(self, analyzer_name: str, analyzer):
         """Register all resources from an analyzer"""
-        # Look for methods decorated with @resource or starting with 'resource_'
-        for attr_name in dir(analyzer):
-            if attr_name.startswith('resource_') or hasattr(getattr(analyzer, attr_name), '_is_mcp_resource'):
-                method = getattr(analyzer, attr_name)
-                
-                # Extract resource path pattern from method
-                if hasattr(method, '_resource_pattern'):
-                    pattern = method._resource_pattern
-                else:
-                    pattern = f"{analyzer_name}://{{{attr_name.replace('resource_', '')}}}"
-                
-                # Create MCP resource wrapper
-                @self.mcp.resource(pattern)
-                def resource_wrapper(*args, **kwargs):
-                    return method(*args, **kwargs)
-                
-                self.resources[f"{analyzer_name}_{attr_name}"] = resource_wrapper
+        # Methods decorated with @mcp_resource or starting with 'resource_'
+        _, resource_names = self._scan_analyzer_class(type(analyzer))
+        for attr_name in resource_names:
+            method = getattr(analyzer, attr_name)
+            
+            # Extract resource path pattern from method
+            pattern = getattr(method, '_resource_pattern', None)
+            if pattern is None:
+                pattern = f"{analyzer_name}://{{{attr_name.replace('resource_', '')}}}"
+            
+            # Register the bound method directly so its parameters match the URI template
+            resource_name = f"{analyzer_name}_{attr_name}"
+            self.mcp.resource(pattern, name=resource_name, description=method.__doc__)(method)
+            self.resources[resource_name] = method
     
     def load_analyzers_from_directory(self, directory: str = "analyzers"):
         """Automatically load all analyzer modules from directory"""
         analyzers_path = Path(__file__).parent / directory
         
-        if not analyzers_path.exists():
+        # One directory read; DirEntry carries the file type, so no per-file stat to filter
+        try:
+            with os.scandir(analyzers_path) as entries:
+                analyzer_files = sorted(
+                    (entry for entry in entries
+                     if entry.name.endswith(".py") and not entry.name.startswith("__") and entry.is_file()),
+                    key=lambda entry: entry.name
+                )
+        except FileNotFoundError:
             logger.warning(f"Analyzers directory not found: {analyzers_path}")
             return
         
-        for file_path in analyzers_path.glob("*.py"):
-            if file_path.name.startswith("__"):
-                continue
-                
-            module_name = file_path.stem
+        for entry in analyzer_files:
+            file_path = entry.path
+            module_name = entry.name[:-3]
             try:
-                # Import the module
-                spec = importlib.util.spec_from_file_location(module_name, file_path)
-                module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(module)
+                # Import the module, reusing the one already executed if the file is unchanged
+                module = self._load_analyzer_module(module_name, entry)
                 
-                # Look for analyzer classes
-                for attr_name in dir(module):
-                    attr = getattr(module, attr_name)
-                    if (isinstance(attr, type) and 
-                        hasattr(attr, '_is_mcp_analyzer') and 
-                        attr._is_mcp_analyzer):
-                        
+                # Look for analyzer classes (one lookup per module global, no dir() sort)
+                for attr_name, attr in list(vars(module).items()):
+                    if isinstance(attr, type) and getattr(attr, '_is_mcp_analyzer', False):
                         self.register_analyzer(attr_name.lower(), attr)
                         
             except Exception as e:
                 logger.error(f"Failed to load analyzer from {file_path}: {e}")
     
+    @classmethod
+    def _load_analyzer_module(cls, module_name: str, entry: os.DirEntry):
+        """Execute an analyzer file, or return the cached module if it hasn't changed"""
+        key = os.path.realpath(entry.path)
+        mtime = entry.stat().st_mtime_ns
+        cached = cls._analyzer_module_cache.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        
+        spec = importlib.util.spec_from_file_location(module_name, entry.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        cls._analyzer_module_cache[key] = (mtime, module)
+        return module
+    
     def add_tool(self, name: str, func: Callable, description: str = None):
         """Manually add a tool function"""
-        @self.mcp.tool()
-        def tool_wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-        
-        tool_wrapper.__name__ = name
-        tool_wrapper.__doc__ = description or func.__doc__
-        self.tools[name] = tool_wrapper
+        self.mcp.tool(name=name, description=description or func.__doc__)(func)
+        self.tools[name] = func
     
     def add_resource(self, pattern: str, func: Callable, description: str = None):
         """Manually add a resource function"""
-        @self.mcp.resource(pattern)
-        def resource_wrapper(*args, **kwargs):
-            return func(*args, **kwargs)
-        
-        resource_wrapper.__doc__ = description or func.__doc__
-        self.resources[pattern] = resource_wrapper
+        self.mcp.resource(pattern, name=pattern, description=description or func.__doc__)(func)
+        self.resources[pattern] = func
     
     def list_tools(self) -> List[str]:
         """List all registered tools"""
@@ -167,10 +197,28 @@ class GenericMCPServer:
         logger.info(f"Registered resources: {self.list_resources()}")
         self.mcp.run()
 
+def _scan_mcp_methods(analyzer_class) -> tuple:
+    """Collect the sorted (tool names, resource names) defined on a class and its bases"""
+    # Walk the class dicts directly instead of dir() + getattr per name;
+    # subclass definitions shadow inherited ones
+    tool_names, resource_names, seen = [], [], set()
+    for klass in analyzer_class.__mro__[:-1]:  # skip object
+        for attr_name, value in vars(klass).items():
+            if attr_name in seen:
+                continue
+            seen.add(attr_name)
+            if attr_name.startswith('tool_') or getattr(value, '_is_mcp_tool', False):
+                tool_names.append(attr_name)
+            if attr_name.startswith('resource_') or getattr(value, '_is_mcp_resource', False):
+                resource_names.append(attr_name)
+    return (tuple(sorted(tool_names)), tuple(sorted(resource_names)))
+
 # Decorators for marking analyzer classes and methods
 def mcp_analyzer(cls):
     """Decorator to mark a class as an MCP analyzer"""
     cls._is_mcp_analyzer = True
+    # Methods are decorated before the class body finishes, so the scan can happen once, here
+    cls._mcp_registration_cache = _scan_mcp_methods(cls)
     return cls
 
 def mcp_tool(func):
@@ -190,6 +238,9 @@ def mcp_resource(pattern: str):
 class BaseAnalyzer:
     """Base class for all analyzers"""
     
+    # Session factory set by GenericMCPServer when a database is configured
+    Session = None
+    
     def __init__(self, database_engine=None):
         self.db_engine = database_engine
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -200,7 +251,8 @@ class BaseAnalyzer:
             return {"error": "Database not available"}
         
         try:
-            # This would be implemented based on your database schema
+            # This would be implemented based on your database schema, using the shared
+            # pooled factory: `with self.Session() as session: ...`
             # For now, just a placeholder
             return {"user_id": user_id, "data": "placeholder"}
         except Exception as e:
@@ -208,6 +260,10 @@ class BaseAnalyzer:
             return {"error": str(e)}
 
 if __name__ == "__main__":
+    # Analyzers import this module by name; alias the running script so they reuse it
+    # instead of executing the whole framework (dotenv, MCP imports) a second time.
+    sys.modules.setdefault("generic_mcp_server", sys.modules[__name__])
+
     # Example usage
     server = GenericMCPServer("ExtensibleFinanceTools")
     
@@ -7,13 +7,15 @@ Installs required dependencies and tests the server
 import subprocess
 import sys
 import os
+import venv
+from importlib.util import find_spec
 from pathlib import Path
 
 def run_command(command, description):
-    """Run a command and handle errors"""
+    """Run a command (an argv list, no shell) and handle errors"""
     print(f"🔧 {description}...")
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
         print(f"✅ {description} completed successfully")
         return True
     except subprocess.CalledProcessError as e:
@@ -45,12 +47,18 @@ def install_dependencies():
     venv_path = Path(__file__).parent / "venv"
     
     if not venv_path.exists():
-        if not run_command(f"python3 -m venv {venv_path}", "Creating virtual environment"):
+        print("🔧 Creating virtual environment...")
+        try:
+            venv.EnvBuilder(with_pip=True).create(str(venv_path))
+            print("✅ Creating virtual environment completed successfully")
+        except Exception as e:
+            print("❌ Creating virtual environment failed:")
+            print(f"   Error: {e}")
             return False
     
     # Install packages
-    pip_command = f"{venv_path}/bin/pip" if venv_path.exists() else "pip3"
-    return run_command(f"{pip_command} install -r {requirements_file}", "Installing dependencies")
+    pip_command = str(venv_path / "bin" / "pip") if venv_path.exists() else "pip3"
+    return run_command([pip_command, "install", "-r", str(requirements_file)], "Installing dependencies")
 
 def test_imports():
     """Test if all required packages can be imported"""
@@ -66,11 +74,18 @@ def test_imports():
         "fastmcp"
     ]
     
+    # Locating a package is enough to know it is installed and skips running its __init__
+    # (together these take over a second to import); psycopg2 is still fully imported because
+    # a missing libpq only shows up when its C extension loads
+    fully_imported = {"psycopg2"}
     failed_imports = []
     
     for package in required_packages:
         try:
-            __import__(package)
+            if package in fully_imported:
+                __import__(package)
+            elif find_spec(package) is None:
+                raise ImportError(f"No module named '{package}'")
             print(f"  ✅ {package}")
         except ImportError as e:
             print(f"  ❌ {package}: {e}")